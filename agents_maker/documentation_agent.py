@@ -8,12 +8,221 @@ from agno.vectordb.lancedb import LanceDb, SearchType
 from agno.knowledge.url import UrlKnowledge
 from agno.tools.reasoning import ReasoningTools
 from agno.tools.file import FileTools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from diskcache import Cache
+from openai import RateLimitError
+from pydantic import PrivateAttr
+from sqlalchemy import create_engine, event
 from dotenv import load_dotenv
+import hashlib
+import httpx
+import json
+import logging
 import os
+import time
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchedOpenRouterEmbedder(OpenRouterEmbedder):
+    """OpenRouter embedder that sends many texts per embeddings request"""
+    # Texts per request and number of requests in flight
+    batch_size: int = 64
+    max_concurrency: int = 4
+    # Retries for a rate limited batch
+    max_retries: int = 5
+    _prefetched: Dict[str, List[float]] = field(default_factory=dict, repr=False)
+
+    def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(
+            input=texts,
+            model=self.model_id,
+            dimensions=self.dimensions,
+        )
+        return [item.embedding for item in response.data]
+
+    def _request_embeddings_with_backoff(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries):
+            try:
+                return self._request_embeddings(texts)
+            except RateLimitError:
+                delay = 2 ** attempt
+                logger.warning(f"Embedding request rate limited, retrying in {delay}s")
+                time.sleep(delay)
+        return self._request_embeddings(texts)
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in batches of batch_size, several batches at a time"""
+        batches = [
+            texts[i:i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            return self._request_embeddings_with_backoff(batches[0])
+
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {
+                pool.submit(self._request_embeddings, batch): i
+                for i, batch in enumerate(batches)
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except RateLimitError:
+                    pass
+
+        # Retry rate limited batches one at a time
+        for i, batch in enumerate(batches):
+            if results[i] is None:
+                results[i] = self._request_embeddings_with_backoff(batch)
+
+        return [embedding for batch in results for embedding in batch]
+
+    def prefetch(self, texts: List[str]) -> None:
+        """Embed texts up front so later per-text lookups skip the API"""
+        pending = list(dict.fromkeys(t for t in texts if t not in self._prefetched))
+        if pending:
+            self._prefetched.update(zip(pending, self.get_embeddings(pending)))
+
+    def get_embedding(self, text: str) -> List[float]:
+        if text in self._prefetched:
+            return self._prefetched.pop(text)
+        return super().get_embedding(text)
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        if text in self._prefetched:
+            return self._prefetched.pop(text), None
+        return super().get_embedding_and_usage(text)
+
+
+@dataclass
+class CachedOpenRouterEmbedder(BatchedOpenRouterEmbedder):
+    """Batched embedder that remembers embeddings by model and text"""
+    # Entries kept in memory; everything is also persisted to cache_dir
+    cache_size: int = 10000
+    cache_dir: str = "tmp/embed_cache"
+    _memory_cache: OrderedDict = field(default_factory=OrderedDict, repr=False)
+    _disk_cache: Optional[Cache] = field(default=None, repr=False)
+
+    def _cache_key(self, text: str, query: bool = False) -> str:
+        # Document chunks are keyed on their exact text since case can matter
+        # (code, identifiers); search queries are normalized, in their own namespace
+        if query:
+            text = "query\n" + text.strip().lower()
+        else:
+            text = "text\n" + text
+        return hashlib.sha256(f"{self.model_id}\n{text}".encode()).hexdigest()
+
+    @property
+    def disk_cache(self) -> Cache:
+        if self._disk_cache is None:
+            self._disk_cache = Cache(self.cache_dir)
+        return self._disk_cache
+
+    def _get_cached(self, key: str) -> Optional[Tuple[float, ...]]:
+        if key in self._memory_cache:
+            self._memory_cache.move_to_end(key)
+            return self._memory_cache[key]
+        embedding = self.disk_cache.get(key)
+        if embedding is not None:
+            self._remember(key, embedding, persist=False)
+        return embedding
+
+    def _remember(self, key: str, embedding, persist: bool = True) -> None:
+        self._memory_cache[key] = tuple(embedding)
+        self._memory_cache.move_to_end(key)
+        while len(self._memory_cache) > self.cache_size:
+            self._memory_cache.popitem(last=False)
+        if persist:
+            self.disk_cache.set(key, tuple(embedding))
+
+    def prefetch(self, texts: List[str]) -> None:
+        pending = {}
+        for text in texts:
+            key = self._cache_key(text)
+            if key not in pending and self._get_cached(key) is None:
+                pending[key] = text
+        if pending:
+            embeddings = self.get_embeddings(list(pending.values()))
+            for key, embedding in zip(pending, embeddings):
+                self._remember(key, embedding)
+
+    def get_embedding(self, text: str) -> List[float]:
+        key = self._cache_key(text)
+        embedding = self._get_cached(key)
+        if embedding is None:
+            embedding = super().get_embedding(text)
+            self._remember(key, embedding)
+        return list(embedding)
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        key = self._cache_key(text)
+        embedding = self._get_cached(key)
+        if embedding is not None:
+            return list(embedding), None
+        embedding, usage = super().get_embedding_and_usage(text)
+        self._remember(key, embedding)
+        return embedding, usage
+
+    def embed_query_with_cache(self, query: str) -> List[float]:
+        """Embed a search query, reusing any earlier embedding of the same normalized query"""
+        key = self._cache_key(query, query=True)
+        embedding = self._get_cached(key)
+        if embedding is None:
+            embedding = self.get_embedding(query)
+            self._remember(key, embedding)
+        return list(embedding)
+
+
+class BatchedUrlKnowledge(UrlKnowledge):
+    """UrlKnowledge that embeds each URL's chunks together before they are inserted"""
+    # URLs that produced documents during the last load; agno logs and skips
+    # URLs it fails to read
+    _loaded_urls: Set[str] = PrivateAttr(default_factory=set)
+
+    @property
+    def loaded_urls(self) -> Set[str]:
+        return self._loaded_urls
+
+    @property
+    def document_lists(self):
+        self._loaded_urls.clear()
+        # agno inserts documents one at a time, so embed the whole list up front
+        # and let the per-document embed calls read the prefetched vectors
+        for document_list in super().document_lists:
+            self.vector_db.embedder.prefetch([document.content for document in document_list])
+            for document in document_list:
+                self._loaded_urls.add((document.meta_data or {}).get("url", document.name))
+            yield document_list
+
+DB_FILE = "tmp/documentation_agent.db"
+os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+
+# Memory and session storage share one SQLite engine in WAL mode so readers
+# don't block the writer during streamed responses
+db_engine = create_engine(
+    f"sqlite:///{DB_FILE}",
+    connect_args={"check_same_thread": False, "timeout": 5},
+)
+
+
+@event.listens_for(db_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 # Set up memory with OpenRouter model
 memory = Memory(
     # Use OpenRouter for creating and managing memories
@@ -24,7 +233,7 @@ memory = Memory(
     # Store memories in a SQLite database
     db=SqliteMemoryDb(
         table_name="documentation_memories", 
-        db_file="tmp/documentation_agent.db"
+        db_engine=db_engine
     ),
     # Enable memory management
     delete_memories=True,
@@ -32,7 +241,7 @@ memory = Memory(
 )
 
 # Set up knowledge base with documentation URLs
-knowledge = UrlKnowledge(
+knowledge = BatchedUrlKnowledge(
     urls=[
         # Add documentation URLs here
         "https://docs.example.com/api",
@@ -42,8 +251,11 @@ knowledge = UrlKnowledge(
         uri="tmp/lancedb",
         table_name="documentation_store",
         search_type=SearchType.hybrid,
+        # Native full-text index, which list_indices() reports, so a later
+        # process can tell it already exists
+        use_tantivy=False,
         # Use OpenRouter for embeddings
-        embedder=OpenRouterEmbedder(
+        embedder=CachedOpenRouterEmbedder(
             api_key=os.getenv("OPENROUTER_API_KEY"),
             model_id="openai/text-embedding-3-small",
             dimensions=1536
@@ -51,10 +263,87 @@ knowledge = UrlKnowledge(
     ),
 )
 
+# Below this many rows a brute-force vector scan beats an ANN index
+ANN_INDEX_MIN_ROWS = 1000
+
+
+def build_vector_indexes(knowledge_base):
+    """Build the IVF-PQ vector index and the full-text index used by hybrid search"""
+    vector_db = knowledge_base.vector_db
+    table = vector_db.table
+    row_count = table.count_rows()
+    if row_count <= ANN_INDEX_MIN_ROWS:
+        logger.info(f"Skipping ANN index for {row_count} rows")
+        return
+
+    # agno's searches don't set a distance type, so they run as L2; an index
+    # built for another metric would be skipped for a brute-force scan. The
+    # embeddings are unit length, so L2 ranks the same as cosine
+    table.create_index(
+        metric="l2",
+        index_type="IVF_PQ",
+        num_partitions=256,
+        num_sub_vectors=96,
+        replace=True,
+    )
+    # LanceDb keeps document text in the payload column
+    table.create_fts_index("payload", use_tantivy=vector_db.use_tantivy, replace=True)
+    logger.info(f"Built ANN and full-text indexes over {row_count} rows")
+
+    # Plan a search the way agno issues it and check it goes through the index
+    probe = [0.0] * vector_db.embedder.dimensions
+    plan = table.search(probe, vector_column_name="vector").limit(1).explain_plan()
+    if "ANNSubIndex" not in plan:
+        logger.warning(f"Vector searches are not using the ANN index:\n{plan}")
+
+
+def has_payload_fts_index(vector_db):
+    """Check whether the table already has a full-text index on the payload column"""
+    if not vector_db.exists():
+        return False
+    return any(
+        "payload" in index.columns and index.index_type.upper() in ("FTS", "INVERTED")
+        for index in vector_db.table.list_indices()
+    )
+
+
+# Content hashes of the documentation URLs as of the last load
+URL_HASHES_FILE = "tmp/url_hashes.json"
+
+
+def find_changed_urls(urls):
+    """Return the URLs whose content changed since the last load, and all current hashes"""
+    try:
+        with open(URL_HASHES_FILE) as f:
+            previous_hashes = json.load(f)
+    except FileNotFoundError:
+        previous_hashes = {}
+
+    current_hashes = {}
+    for url in urls:
+        try:
+            response = httpx.get(url, follow_redirects=True, timeout=30)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # Leave the hash unset so the URL is loaded now and checked again next run
+            logger.warning(f"Could not fetch {url} for change detection: {e}")
+            continue
+        current_hashes[url] = hashlib.sha256(response.content).hexdigest()
+
+    changed = [url for url in urls if current_hashes.get(url) is None
+               or previous_hashes.get(url) != current_hashes[url]]
+    return changed, current_hashes
+
+
+def save_url_hashes(url_hashes):
+    with open(URL_HASHES_FILE, "w") as f:
+        json.dump(url_hashes, f, indent=2)
+
+
 # Store agent sessions in a SQLite database
 storage = SqliteStorage(
     table_name="documentation_sessions", 
-    db_file="tmp/documentation_agent.db"
+    db_engine=db_engine
 )
 
 # Create the documentation agent
@@ -89,9 +378,29 @@ documentation_agent = Agent(
 )
 
 if __name__ == "__main__":
-    # Load the knowledge base (first time only)
-    # Comment out after first run or set recreate to False
-    documentation_agent.knowledge.load(recreate=True)
+    # Rebuild the knowledge base only when a documentation URL changed, the
+    # table is missing or empty, or RECREATE_KB=true. Rebuilding drops chunks
+    # from old page versions; chunks whose text is unchanged come from the
+    # embedding cache
+    recreate = os.getenv("RECREATE_KB", "false").lower() == "true"
+    changed_urls, url_hashes = find_changed_urls(knowledge.urls)
+    vector_db = knowledge.vector_db
+    table_empty = not vector_db.exists() or vector_db.get_count() == 0
+    if recreate or changed_urls or table_empty:
+        logger.info(f"Rebuilding knowledge base, changed URLs: {changed_urls}")
+        knowledge.load(recreate=True, upsert=True)
+        # Only remember URLs that made it into the table, so a URL that
+        # failed to load is retried on the next run
+        save_url_hashes({
+            url: url_hash for url, url_hash in url_hashes.items()
+            if url in knowledge.loaded_urls
+        })
+        build_vector_indexes(knowledge)
+    else:
+        logger.info("Knowledge base is up to date")
+    # agno starts each process assuming there is no full-text index and
+    # rebuilds it on the first hybrid search unless told otherwise
+    vector_db.fts_index_exists = has_payload_fts_index(vector_db)
     
     # Example usage
     documentation_agent.print_response(
@@ -2,13 +2,23 @@ import os
 import subprocess
 import time
 import json
+import math
+import re
+import shutil
+import tarfile
+import tempfile
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Any, List, Literal, Optional
 import uvicorn
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Query
-from elasticsearch import Elasticsearch
+from elasticsearch import AsyncElasticsearch, BadRequestError
+from elasticsearch.helpers import async_streaming_bulk
 from pydantic import BaseModel
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,6 +31,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def parse_time_value(value):
+    """Convert an Elasticsearch time value such as "30s" to seconds; -1 is never"""
+    value = value.strip()
+    if value == "-1":
+        return math.inf
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)(nanos|micros|ms|s|m|h|d)", value)
+    if not match:
+        raise ValueError(f"Invalid time value: {value}")
+    units = {
+        "nanos": 1e-9, "micros": 1e-6, "ms": 1e-3,
+        "s": 1, "m": 60, "h": 3600, "d": 86400
+    }
+    return float(match.group(1)) * units[match.group(2)]
+
 # Constants
 ES_PORT = 9200
 ES_INDEX = "documentation_data"
@@ -36,6 +60,49 @@ KIBANA_DOWNLOAD_URL = (
     "kibana-8.12.1-linux-x86_64.tar.gz"
 )
 KIBANA_DIR = "kibana-8.12.1"
+# Bulk ingestion: buffered documents are flushed once STORE_BULK_SIZE docs are
+# queued or STORE_FLUSH_MS milliseconds have passed, whichever comes first
+STORE_BULK_SIZE = int(os.getenv("STORE_BULK_SIZE", "1000"))
+STORE_FLUSH_MS = int(os.getenv("STORE_FLUSH_MS", "1000"))
+STORE_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+STORE_DEAD_LETTER_SIZE = 1000
+# Buffered documents beyond which stores are refused until ES catches up
+STORE_BUFFER_MAX = int(os.getenv("STORE_BUFFER_MAX", "100000"))
+# Longer refresh interval means fewer segments and faster indexing
+ES_REFRESH_INTERVAL = os.getenv("ES_REFRESH_INTERVAL", "30s")
+ES_REFRESH_SECONDS = parse_time_value(ES_REFRESH_INTERVAL)
+ES_API_WORKERS = int(os.getenv("ES_API_WORKERS", "1"))
+# Concurrent HTTP connections from the API to Elasticsearch
+ES_CONNECTIONS = 32
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 60
+# The query cache lives in each worker process, and a write handled by one
+# worker can't invalidate the others, so it is only used with a single worker.
+# Without scheduled refreshes (-1) there is no telling when a write becomes
+# searchable, so it is off then too
+QUERY_CACHE_ENABLED = ES_API_WORKERS == 1 and ES_REFRESH_SECONDS != math.inf
+
+# Settings and mapping used to create the index
+ES_INDEX_MAPPING = {
+    "settings": {
+        "index": {
+            "refresh_interval": ES_REFRESH_INTERVAL,
+            # DEFLATE stored fields: smaller shards, less disk I/O
+            "codec": "best_compression",
+            "number_of_shards": 1,
+            "number_of_replicas": 0,
+            "translog": {"flush_threshold_size": "1gb"}
+        }
+    },
+    "mappings": {
+        "properties": {
+            "text": {"type": "text"},
+            "auid": {"type": "keyword"},
+            "additional_args": {"type": "object"},
+            "timestamp": {"type": "date"}
+        }
+    }
+}
 
 # Data model for storing documentation
 class DocumentData(BaseModel):
@@ -43,21 +110,135 @@ class DocumentData(BaseModel):
     auid: str
     additional_args: Optional[Dict[str, Any]] = None
 
+# Request body for storing several documents at once
+class BatchDocs(BaseModel):
+    docs: List[DocumentData]
+
 # Initialize FastAPI app
 app = FastAPI(title="Documentation Storage API")
 
 # Global Elasticsearch client
 es_client = None
 
+# Pending bulk actions and the background task that flushes them
+store_buffer = deque()
+store_flush_event = None
+store_flusher_task = None
+store_flusher_stopping = False
+# Documents Elasticsearch refused to index, with the error it returned
+store_dead_letters = deque(maxlen=STORE_DEAD_LETTER_SIZE)
+
+# Recent /getdata responses keyed by auid
+query_cache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+query_cache_hits = 0
+query_cache_misses = 0
+
+# Writes the index can't show yet, so /getdata doesn't cache results that
+# miss them: buffered documents per auid, the monotonic time at which an
+# auid's flushed documents become searchable, and a counter bumped on every
+# write so a search that overlapped one isn't cached
+auid_pending_writes = Counter()
+auid_visible_at = OrderedDict()
+store_generation = 0
+
+# Keep-alive session reused by the readiness probes
+_probe = requests.Session()
+_probe.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+
+def mark_auid_queued(auid):
+    """Record a buffered write so reads of the auid aren't cached"""
+    global store_generation
+    if not QUERY_CACHE_ENABLED:
+        return
+    store_generation += 1
+    auid_pending_writes[auid] += 1
+    query_cache.pop(auid, None)
+
+def mark_auid_flushed(auid, refreshed):
+    """Record that a buffered write for the auid has been sent to Elasticsearch"""
+    global store_generation
+    if not QUERY_CACHE_ENABLED:
+        return
+    store_generation += 1
+    auid_pending_writes[auid] -= 1
+    if auid_pending_writes[auid] <= 0:
+        del auid_pending_writes[auid]
+    query_cache.pop(auid, None)
+
+    now = time.monotonic()
+    auid_visible_at.pop(auid, None)
+    if not refreshed:
+        # Without an explicit refresh the write shows up at the next
+        # scheduled one. Every deadline is now + the same interval, so the
+        # dict stays in deadline order and expired entries sit at the front
+        auid_visible_at[auid] = now + ES_REFRESH_SECONDS
+    while auid_visible_at:
+        oldest_auid, visible_at = next(iter(auid_visible_at.items()))
+        if visible_at > now:
+            break
+        del auid_visible_at[oldest_auid]
+
+def auid_is_dirty(auid):
+    """Check whether the auid has writes that searches may not show yet"""
+    if auid_pending_writes.get(auid):
+        return True
+    visible_at = auid_visible_at.get(auid)
+    if visible_at is None:
+        return False
+    if time.monotonic() < visible_at:
+        return True
+    del auid_visible_at[auid]
+    return False
+
+def is_server_up(url):
+    """Check whether a server answers a HEAD request with 200"""
+    try:
+        response = _probe.head(url, timeout=0.5, allow_redirects=True)
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+def wait_for_server(url, timeout):
+    """
+    Poll a server until it is up or timeout seconds have passed
+    
+    Returns:
+        True if the server came up in time
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while time.monotonic() < deadline:
+        if is_server_up(url):
+            return True
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        delay = min(1.0, delay * 2)
+    return is_server_up(url)
+
+def download_and_extract(url, target_dir):
+    """
+    Stream a .tar.gz archive and extract it in a single pass
+    
+    The archive is extracted into a temporary directory and target_dir is
+    only moved into place once extraction finished, so an interrupted
+    download never leaves a partial install behind.
+    """
+    staging_dir = tempfile.mkdtemp(prefix=f".{target_dir}-", dir=".")
+    try:
+        with requests.get(url, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                archive.extractall(staging_dir, filter="data")
+        os.rename(os.path.join(staging_dir, target_dir), target_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
 def download_elasticsearch():
     """Download Elasticsearch if not already present"""
     if not os.path.exists(ES_DIR):
         logger.info(f"Downloading Elasticsearch from {ES_DOWNLOAD_URL}")
-        subprocess.run(["wget", ES_DOWNLOAD_URL], check=True)
-        subprocess.run(
-            ["tar", "-xzf", "elasticsearch-8.12.1-linux-x86_64.tar.gz"], 
-            check=True
-        )
+        download_and_extract(ES_DOWNLOAD_URL, ES_DIR)
         logger.info("Elasticsearch downloaded and configured")
 
 def start_elasticsearch():
@@ -66,13 +247,10 @@ def start_elasticsearch():
         download_elasticsearch()
     
     # Check if Elasticsearch is already running
-    try:
-        response = requests.get(f"http://localhost:{ES_PORT}")
-        if response.status_code == 200:
-            logger.info("Elasticsearch is already running")
-            return
-    except requests.exceptions.ConnectionError:
-        pass
+    es_url = f"http://localhost:{ES_PORT}"
+    if is_server_up(es_url):
+        logger.info("Elasticsearch is already running")
+        return
     
     # Start Elasticsearch
     logger.info("Starting Elasticsearch server...")
@@ -84,55 +262,44 @@ def start_elasticsearch():
     )
     
     # Wait for Elasticsearch to start
-    max_retries = 30
-    for i in range(max_retries):
-        try:
-            response = requests.get(f"http://localhost:{ES_PORT}")
-            if response.status_code == 200:
-                logger.info("Elasticsearch server started successfully")
-                return
-        except requests.exceptions.ConnectionError:
-            pass
-        time.sleep(1)
+    if wait_for_server(es_url, timeout=30):
+        logger.info("Elasticsearch server started successfully")
+        return
     
     # If we get here, Elasticsearch didn't start
     logger.error("Failed to start Elasticsearch server")
     raise RuntimeError("Elasticsearch server failed to start")
 
-def setup_elasticsearch_index():
+async def setup_elasticsearch_index():
     """Create Elasticsearch index if it doesn't exist"""
     global es_client
-    es_client = Elasticsearch(
+    # One shared client whose connection pool serves all request handlers
+    es_client = AsyncElasticsearch(
         f"https://localhost:{ES_PORT}",
         basic_auth=("elastic", "YgUkMD5Ea9VWEe3QhOJI"),
-        verify_certs=False
+        verify_certs=False,
+        http_compress=True,
+        connections_per_node=ES_CONNECTIONS,
+        retry_on_timeout=True,
+        sniff_on_start=False,
+        request_timeout=30
     )
     
-    # Check if index exists
-    if not es_client.indices.exists(index=ES_INDEX):
-        # Create index with mapping
-        mapping = {
-            "mappings": {
-                "properties": {
-                    "text": {"type": "text"},
-                    "auid": {"type": "keyword"},
-                    "additional_args": {"type": "object"},
-                    "timestamp": {"type": "date"}
-                }
-            }
-        }
-        es_client.indices.create(index=ES_INDEX, body=mapping)
-        logger.info(f"Created Elasticsearch index: {ES_INDEX}")
+    # Check if index exists. Several workers may race past this check, so
+    # an index created in the meantime by another worker is not an error
+    if not await es_client.indices.exists(index=ES_INDEX):
+        try:
+            await es_client.indices.create(index=ES_INDEX, body=ES_INDEX_MAPPING)
+            logger.info(f"Created Elasticsearch index: {ES_INDEX}")
+        except BadRequestError as e:
+            if e.error != "resource_already_exists_exception":
+                raise
 
 def download_kibana():
     """Download Kibana if not already present"""
     if not os.path.exists(KIBANA_DIR):
         logger.info(f"Downloading Kibana from {KIBANA_DOWNLOAD_URL}")
-        subprocess.run(["wget", KIBANA_DOWNLOAD_URL], check=True)
-        subprocess.run(
-            ["tar", "-xzf", "kibana-8.12.1-linux-x86_64.tar.gz"],
-            check=True
-        )
+        download_and_extract(KIBANA_DOWNLOAD_URL, KIBANA_DIR)
         logger.info("Kibana downloaded and extracted")
 
 def start_kibana():
@@ -141,13 +308,10 @@ def start_kibana():
         download_kibana()
 
     # Check if Kibana is already running
-    try:
-        response = requests.get(f"http://localhost:{KIBANA_PORT}")
-        if response.status_code == 200:
-            logger.info("Kibana is already running")
-            return
-    except requests.exceptions.ConnectionError:
-        pass
+    kibana_url = f"http://localhost:{KIBANA_PORT}"
+    if is_server_up(kibana_url):
+        logger.info("Kibana is already running")
+        return
 
     logger.info("Starting Kibana server...")
     subprocess.Popen(
@@ -157,25 +321,151 @@ def start_kibana():
     )
 
     # Wait for Kibana to start
-    max_retries = 60
-    for i in range(max_retries):
-        try:
-            response = requests.get(f"http://localhost:{KIBANA_PORT}")
-            if response.status_code == 200:
-                logger.info("Kibana server started successfully")
-                return
-        except requests.exceptions.ConnectionError:
-            pass
-        time.sleep(1)
+    if wait_for_server(kibana_url, timeout=60):
+        logger.info("Kibana server started successfully")
+        return
     logger.error("Failed to start Kibana server")
     raise RuntimeError("Kibana server failed to start")
 
+async def flush_store_buffer(refresh=None):
+    """
+    Drain the store buffer into Elasticsearch with _bulk requests
+    
+    Documents rejected because the cluster is busy (HTTP 429) are queued
+    again; any other per-document failure is logged and kept in
+    store_dead_letters. If a bulk request itself fails, the documents it
+    didn't get to are queued again and left out of the results.
+    
+    Args:
+        refresh: Optional refresh policy for the bulk request ("true",
+            "false" or "wait_for")
+
+    Returns:
+        Dict mapping id() of each sent action to its bulk result item
+    """
+    if not store_buffer:
+        return {}
+
+    actions = [store_buffer.popleft() for _ in range(len(store_buffer))]
+    refreshed = refresh in ("true", "wait_for")
+    results = {}
+    indexed = requeued = failed = 0
+    try:
+        # Results come back in action order, one per action
+        async for ok, item in async_streaming_bulk(
+            es_client.options(request_timeout=60),
+            actions,
+            chunk_size=STORE_BULK_SIZE,
+            max_chunk_bytes=STORE_MAX_CHUNK_BYTES,
+            raise_on_error=False,
+            **({"refresh": refresh} if refresh else {})
+        ):
+            action = actions[len(results)]
+            result = item["index"]
+            results[id(action)] = result
+            if result.get("status") == 429:
+                store_buffer.append(action)
+                requeued += 1
+                continue
+            mark_auid_flushed(action["_source"]["auid"], refreshed)
+            if ok:
+                indexed += 1
+            else:
+                logger.error(
+                    f"Failed to index document for auid {action['_source']['auid']}: "
+                    f"{result.get('error')}"
+                )
+                store_dead_letters.append({"action": action, "error": result.get("error")})
+                failed += 1
+    except Exception as e:
+        logger.error(
+            f"Bulk request failed, {len(actions) - len(results)} documents "
+            f"queued for retry: {str(e)}"
+        )
+    finally:
+        # Put back whatever the bulk requests didn't get to, so the next
+        # flush retries it
+        store_buffer.extendleft(reversed(actions[len(results):]))
+
+    logger.info(
+        f"Bulk indexed {indexed} documents ({requeued} requeued, {failed} failed)"
+    )
+    return results
+
+async def store_flusher():
+    """Flush the store buffer on size or time threshold until asked to stop"""
+    while not store_flusher_stopping:
+        try:
+            await asyncio.wait_for(
+                store_flush_event.wait(), timeout=STORE_FLUSH_MS / 1000
+            )
+        except asyncio.TimeoutError:
+            pass
+        store_flush_event.clear()
+        try:
+            await flush_store_buffer()
+        except Exception as e:
+            logger.error(f"Error flushing store buffer: {str(e)}")
+
 @app.on_event("startup")
 async def startup_event():
-    """Start Elasticsearch and setup index on FastAPI startup"""
-    start_elasticsearch()
-    setup_elasticsearch_index()
-    start_kibana()
+    """Set up this worker's Elasticsearch client, index and bulk flusher"""
+    global store_flush_event, store_flusher_task
+    await setup_elasticsearch_index()
+    store_flush_event = asyncio.Event()
+    store_flusher_task = asyncio.create_task(store_flusher())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the flusher and index any documents still buffered"""
+    global store_flusher_stopping
+    if store_flusher_task:
+        # Let an in-flight flush finish (and re-queue anything it couldn't
+        # send) before the final flush below drains the buffer
+        store_flusher_stopping = True
+        store_flush_event.set()
+        await store_flusher_task
+    try:
+        await flush_store_buffer()
+    except Exception as e:
+        logger.error(f"Error flushing store buffer on shutdown: {str(e)}")
+    if es_client:
+        await es_client.close()
+
+def check_buffer_capacity(count):
+    """Refuse new documents with a 503 while the store buffer is full"""
+    if len(store_buffer) + count > STORE_BUFFER_MAX:
+        logger.warning(f"Store buffer full ({len(store_buffer)} documents), refusing writes")
+        raise HTTPException(
+            status_code=503,
+            detail="Store buffer is full, retry later",
+            headers={"Retry-After": str(max(1, STORE_FLUSH_MS // 1000))}
+        )
+
+def queue_document(text, auid, additional_args):
+    """
+    Queue a document for the next bulk request to Elasticsearch
+    
+    No _id is set, so Elasticsearch assigns one and can take its faster
+    append-only indexing path.
+    
+    Returns:
+        The queued bulk action
+    """
+    action = {
+        "_index": ES_INDEX,
+        # Route by auid so all of an auid's documents share one shard
+        "_routing": auid,
+        "_source": {
+            "text": text,
+            "auid": auid,
+            "additional_args": additional_args,
+            "timestamp": time.time()
+        }
+    }
+    store_buffer.append(action)
+    mark_auid_queued(auid)
+    return action
 
 @app.get("/storedata")
 async def store_data(
@@ -183,43 +473,125 @@ async def store_data(
     auid: str = Query(..., description="Unique identifier for the data"),
     additional_args: Optional[str] = Query(
         None, description="JSON string of additional arguments"
+    ),
+    flush: bool = Query(
+        False, description="Wait until the document has been indexed"
+    ),
+    refresh: Optional[Literal["true", "false", "wait_for"]] = Query(
+        None, description="Refresh policy when indexing: true, false or wait_for"
     )
 ):
     """
     Store data in Elasticsearch
     
+    Documents are buffered and bulk indexed in the background unless
+    flush is set or refresh is true or wait_for, in which case the buffer
+    is drained before returning. refresh=wait_for also waits until the
+    document is searchable.
+    
     Args:
         text: Textual data to store
         auid: Unique identifier for the data
         additional_args: Optional JSON string of additional arguments
+        flush: Wait until the document has been indexed
+        refresh: Optional refresh policy passed to the bulk request
     
     Returns:
-        Dict with status and document ID
+        Dict with status and, once indexed, the document ID
     """
+    check_buffer_capacity(1)
     try:
         # Parse additional_args if provided
         additional_args_dict = json.loads(additional_args) if additional_args else {}
         
-        # Create document
-        document = {
-            "text": text,
-            "auid": auid,
-            "additional_args": additional_args_dict,
-            "timestamp": time.time()
-        }
+        action = queue_document(text, auid, additional_args_dict)
+        document_id = None
         
-        # Store in Elasticsearch
-        result = es_client.index(index=ES_INDEX, document=document)
+        if flush or refresh in ("true", "wait_for"):
+            # No result means the bulk request failed before reaching this
+            # document, which is back in the buffer like a 429 rejection
+            result = (await flush_store_buffer(refresh)).get(id(action))
+            if result is None or result.get("status") == 429:
+                message = "Elasticsearch is unavailable, data queued for retry"
+            elif "error" in result:
+                raise RuntimeError(f"Document failed to index: {result['error']}")
+            else:
+                document_id = result["_id"]
+                message = "Data stored successfully"
+        else:
+            if len(store_buffer) >= STORE_BULK_SIZE:
+                store_flush_event.set()
+            message = "Data queued for storage"
         
         return {
             "status": "success",
-            "message": "Data stored successfully",
-            "document_id": result["_id"]
+            "message": message,
+            "document_id": document_id
         }
     except Exception as e:
         logger.error(f"Error storing data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error storing data: {str(e)}")
 
+@app.post("/storedata/batch")
+async def store_data_batch(
+    body: BatchDocs,
+    flush: bool = Query(
+        False, description="Wait until the documents have been indexed"
+    )
+):
+    """
+    Store a batch of documents in Elasticsearch
+    
+    Args:
+        body: Documents to store
+        flush: Wait until the documents have been indexed
+    
+    Returns:
+        Dict with status and, when flushed, the document ID of each stored
+        document plus the positions of documents that failed or were
+        queued for retry
+    """
+    check_buffer_capacity(len(body.docs))
+    try:
+        actions = [
+            queue_document(doc.text, doc.auid, doc.additional_args or {})
+            for doc in body.docs
+        ]
+        
+        if flush:
+            results = await flush_store_buffer()
+            items = [results.get(id(action)) for action in actions]
+            requeued = [
+                i for i, r in enumerate(items)
+                if r is None or r.get("status") == 429
+            ]
+            failed = [
+                {"position": i, "error": r["error"]}
+                for i, r in enumerate(items)
+                if r is not None and "error" in r and r.get("status") != 429
+            ]
+            document_ids = [
+                None if r is None or "error" in r else r["_id"] for r in items
+            ]
+            return {
+                "status": "success" if not failed and not requeued else "partial",
+                "message": f"Stored {len(items) - len(failed) - len(requeued)} documents",
+                "document_ids": document_ids,
+                "failed": failed,
+                "requeued": requeued
+            }
+        
+        if len(store_buffer) >= STORE_BULK_SIZE:
+            store_flush_event.set()
+        return {
+            "status": "success",
+            "message": f"Queued {len(actions)} documents for storage",
+            "count": len(actions)
+        }
+    except Exception as e:
+        logger.error(f"Error storing batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error storing batch: {str(e)}")
+
 @app.get("/getdata")
 async def get_data(
     auid: str = Query(..., description="Unique identifier to retrieve data")
@@ -233,20 +605,36 @@ async def get_data(
     Returns:
         List of documents matching the auid
     """
+    global query_cache_hits, query_cache_misses
+    
+    if QUERY_CACHE_ENABLED:
+        cached = query_cache.get(auid)
+        if cached is not None:
+            query_cache_hits += 1
+            return cached
+        query_cache_misses += 1
+    generation = store_generation
+    
     try:
         # Search for documents with matching auid
+        # Filter context skips scoring and lets ES cache the auid filter
         query = {
             "query": {
-                "term": {
-                    "auid": auid
+                "bool": {
+                    "filter": [
+                        {"term": {"auid": auid}}
+                    ]
                 }
             },
             "sort": [
                 {"timestamp": {"order": "desc"}}
-            ]
+            ],
+            "track_total_hits": False,
+            "size": 100,
+            "_source": ["text", "auid", "timestamp", "additional_args"]
         }
         
-        result = es_client.search(index=ES_INDEX, body=query)
+        result = await es_client.search(index=ES_INDEX, body=query, routing=auid)
         
         # Extract and return documents
         documents = []
@@ -255,15 +643,67 @@ async def get_data(
             doc["document_id"] = hit["_id"]
             documents.append(doc)
         
-        return {
+        response = {
             "status": "success",
             "count": len(documents),
             "documents": documents
         }
+        # Only cache results that can't be missing writes to this auid
+        if (QUERY_CACHE_ENABLED and store_generation == generation
+                and not auid_is_dirty(auid)):
+            query_cache[auid] = response
+        return response
     except Exception as e:
         logger.error(f"Error retrieving data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving data: {str(e)}")
 
+@app.get("/storedata/dead_letters")
+async def dead_letters():
+    """
+    List recent documents Elasticsearch refused to index
+    
+    Returns:
+        Dict with the number of entries and each document with its error
+    """
+    return {
+        "count": len(store_dead_letters),
+        "documents": [
+            {"document": entry["action"]["_source"], "error": entry["error"]}
+            for entry in store_dead_letters
+        ]
+    }
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Report /getdata query cache usage
+    
+    Returns:
+        Dict with cache state, size, capacity, TTL and hit/miss counters
+    """
+    return {
+        "enabled": QUERY_CACHE_ENABLED,
+        "size": len(query_cache),
+        "maxsize": query_cache.maxsize,
+        "ttl": query_cache.ttl,
+        "hits": query_cache_hits,
+        "misses": query_cache_misses
+    }
+
 if __name__ == "__main__":
-    # Start FastAPI server
-    uvicorn.run(app, host="0.0.0.0", port=FASTAPI_PORT)
+    # Start the servers once here rather than in every worker
+    start_elasticsearch()
+    start_kibana()
+    
+    # Start FastAPI server. Each worker process runs the startup event and
+    # builds its own client and buffer
+    uvicorn.run(
+        "start_es_server:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host="0.0.0.0",
+        port=FASTAPI_PORT,
+        workers=ES_API_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        log_config=None
+    )
@@ -1,6 +1,9 @@
 import subprocess
+import asyncio
+import hashlib
 import time
 import requests
+import httpx
 import json
 import os
 import sys
@@ -8,8 +11,9 @@ import signal
 import webbrowser
 from datetime import datetime
 from pathlib import Path
+import jinja2
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 import logging
@@ -29,14 +33,74 @@ ES_SERVER_PORT = 9200
 FASTAPI_PORT = 8000
 REPORT_PORT = 8011
 ES_SERVER_SCRIPT = "servers_setup/start_es_server.py"
+ES_SERVER_LOG = "tmp/es_server.out"
 REPORT_DIR = "verification_reports"
 REPORT_FILE = f"{REPORT_DIR}/verification_report.html"
+TEST_TIMEOUT = 60
+
+# Report layout, compiled once at import; autoescape keeps exception
+# messages from injecting markup into the page
+REPORT_TEMPLATE = jinja2.Environment(autoescape=True).from_string("""
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Elasticsearch Server Verification Report</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        h1, h2 { color: #333; }
+        .summary { background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin-bottom: 20px; }
+        .summary-item { margin: 5px 0; }
+        .test-results { border-collapse: collapse; width: 100%; }
+        .test-results th, .test-results td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        .test-results th { background-color: #f2f2f2; }
+        .test-results tr:nth-child(even) { background-color: #f9f9f9; }
+        .pass { color: green; }
+        .fail { color: red; }
+        .timestamp { color: #666; font-size: 0.9em; }
+    </style>
+</head>
+<body>
+    <h1>Elasticsearch Server Verification Report</h1>
+    <div class="timestamp">Generated on: {{ now.strftime("%Y-%m-%d %H:%M:%S") }}</div>
+    
+    <div class="summary">
+        <h2>Summary</h2>
+        <div class="summary-item">Total Tests: {{ total }}</div>
+        <div class="summary-item">Passed: <span class="pass">{{ passed }}</span></div>
+        <div class="summary-item">Failed: <span class="fail">{{ failed }}</span></div>
+        <div class="summary-item">Success Rate: {{ "%.1f"|format(success_rate) }}%</div>
+    </div>
+    
+    <h2>Test Results</h2>
+    <table class="test-results">
+        <tr>
+            <th>Test Name</th>
+            <th>Status</th>
+            <th>Message</th>
+            <th>Duration</th>
+            <th>Timestamp</th>
+        </tr>
+        {% for result in results %}
+        <tr>
+            <td>{{ result.name }}</td>
+            <td class="{{ 'pass' if result.success else 'fail' }}">{{ 'PASS' if result.success else 'FAIL' }}</td>
+            <td>{{ result.message }}</td>
+            <td>{{ result.duration }}</td>
+            <td>{{ result.timestamp }}</td>
+        </tr>
+        {% endfor %}
+    </table>
+</body>
+</html>
+""")
 
 # Global variables
 es_server_process = None
 report_app = FastAPI(title="ES Server Verification Report")
 test_results = []
-report_generated = False
+# Rendered report served from memory, with its ETag
+report_bytes = None
+report_etag = None
 
 
 def generate_random_string(length=10):
@@ -44,17 +108,36 @@ def generate_random_string(length=10):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
 
+def servers_running():
+    """Check whether Elasticsearch and the FastAPI server are already up"""
+    try:
+        es_response = requests.get(f"http://localhost:{ES_SERVER_PORT}")
+        api_response = requests.get(f"http://localhost:{FASTAPI_PORT}/docs")
+        return es_response.status_code == 200 and api_response.status_code == 200
+    except requests.exceptions.ConnectionError:
+        return False
+
+
 def start_es_server():
     """Start the Elasticsearch server script"""
     global es_server_process
     
-    # Create a new process to run the ES server
-    es_server_process = subprocess.Popen(
-        [sys.executable, ES_SERVER_SCRIPT],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
+    # Reuse a cluster that is already running instead of cold starting one
+    if servers_running():
+        logger.info("Reusing running Elasticsearch and FastAPI servers")
+        return True
+    
+    # Create a new process to run the ES server. Output goes to a log file
+    # since an unread pipe would fill up and block the server, and a new
+    # session gives stop_es_server a process group to signal
+    os.makedirs(os.path.dirname(ES_SERVER_LOG), exist_ok=True)
+    with open(ES_SERVER_LOG, "ab") as log_file:
+        es_server_process = subprocess.Popen(
+            [sys.executable, ES_SERVER_SCRIPT],
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
     
     # Wait for the server to start
     max_retries = 30
@@ -86,11 +169,11 @@ def stop_es_server():
         logger.info("Elasticsearch server stopped")
 
 
-def run_test(test_name, test_func):
-    """Run a test and record the result"""
+async def run_test(test_name, test_func):
+    """Run a test and return its result record"""
     start_time = time.time()
     try:
-        result = test_func()
+        result = await test_func()
         success = True
         message = "Test passed"
     except Exception as e:
@@ -107,25 +190,23 @@ def run_test(test_name, test_func):
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
     
-    test_results.append(test_result)
     logger.info(f"Test '{test_name}': {'PASSED' if success else 'FAILED'} - {message}")
     
-    return success
+    return test_result
 
 
-def test_elasticsearch_connection():
+async def test_elasticsearch_connection(client):
     """Test connection to Elasticsearch server"""
-    response = requests.get(f"http://localhost:{ES_SERVER_PORT}")
+    response = await client.get(f"http://localhost:{ES_SERVER_PORT}")
     if response.status_code != 200:
         raise Exception(f"Elasticsearch server returned status code {response.status_code}")
     return True
 
 
-def test_store_data():
+async def test_store_data(client, test_auid):
     """Test storing data via the /storedata endpoint"""
     # Generate random test data
     test_text = f"Test data: {generate_random_string()}"
-    test_auid = f"test_{generate_random_string(5)}"
     test_args = json.dumps({"test_key": "test_value"})
     
     # Store the data
@@ -133,10 +214,12 @@ def test_store_data():
     params = {
         "text": test_text,
         "auid": test_auid,
-        "additional_args": test_args
+        "additional_args": test_args,
+        # Return once the document is visible to searches
+        "refresh": "wait_for"
     }
     
-    response = requests.get(url, params=params)
+    response = await client.get(url, params=params)
     if response.status_code != 200:
         raise Exception(f"Failed to store data: {response.text}")
     
@@ -147,12 +230,12 @@ def test_store_data():
     return result["document_id"]
 
 
-def test_get_data(auid):
+async def test_get_data(client, auid):
     """Test retrieving data via the /getdata endpoint"""
     url = f"http://localhost:{FASTAPI_PORT}/getdata"
     params = {"auid": auid}
     
-    response = requests.get(url, params=params)
+    response = await client.get(url, params=params)
     if response.status_code != 200:
         raise Exception(f"Failed to get data: {response.text}")
     
@@ -166,12 +249,12 @@ def test_get_data(auid):
     return result["documents"]
 
 
-def test_invalid_auid():
+async def test_invalid_auid(client):
     """Test retrieving data with an invalid auid"""
     url = f"http://localhost:{FASTAPI_PORT}/getdata"
     params = {"auid": "nonexistent_auid"}
     
-    response = requests.get(url, params=params)
+    response = await client.get(url, params=params)
     if response.status_code != 200:
         raise Exception(f"Failed to get data: {response.text}")
     
@@ -182,6 +265,31 @@ def test_invalid_auid():
     return True
 
 
+async def run_store_and_get(client):
+    """Store a document, then read it back if the store succeeded"""
+    test_auid = f"test_{generate_random_string(5)}"
+    store_result = await run_test("Store Data", lambda: test_store_data(client, test_auid))
+    if not store_result["success"]:
+        return [store_result]
+    get_result = await run_test("Get Data", lambda: test_get_data(client, test_auid))
+    return [store_result, get_result]
+
+
+async def run_tests():
+    """Run independent tests concurrently and record results in a stable order"""
+    # refresh=wait_for can take up to one refresh interval to return
+    async with httpx.AsyncClient(timeout=TEST_TIMEOUT) as client:
+        connection_result, store_and_get_results, invalid_result = await asyncio.gather(
+            run_test("Elasticsearch Connection", lambda: test_elasticsearch_connection(client)),
+            run_store_and_get(client),
+            run_test("Invalid AUID", lambda: test_invalid_auid(client))
+        )
+    
+    test_results.append(connection_result)
+    test_results.extend(store_and_get_results)
+    test_results.append(invalid_result)
+
+
 def generate_html_report():
     """Generate an HTML report of the test results"""
     # Create report directory if it doesn't exist
@@ -193,94 +301,41 @@ def generate_html_report():
     failed_tests = total_tests - passed_tests
     success_rate = (passed_tests / total_tests) * 100 if total_tests > 0 else 0
     
-    # Generate HTML content
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Elasticsearch Server Verification Report</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            h1, h2 {{ color: #333; }}
-            .summary {{ background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin-bottom: 20px; }}
-            .summary-item {{ margin: 5px 0; }}
-            .test-results {{ border-collapse: collapse; width: 100%; }}
-            .test-results th, .test-results td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            .test-results th {{ background-color: #f2f2f2; }}
-            .test-results tr:nth-child(even) {{ background-color: #f9f9f9; }}
-            .pass {{ color: green; }}
-            .fail {{ color: red; }}
-            .timestamp {{ color: #666; font-size: 0.9em; }}
-        </style>
-    </head>
-    <body>
-        <h1>Elasticsearch Server Verification Report</h1>
-        <div class="timestamp">Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</div>
-        
-        <div class="summary">
-            <h2>Summary</h2>
-            <div class="summary-item">Total Tests: {total_tests}</div>
-            <div class="summary-item">Passed: <span class="pass">{passed_tests}</span></div>
-            <div class="summary-item">Failed: <span class="fail">{failed_tests}</span></div>
-            <div class="summary-item">Success Rate: {success_rate:.1f}%</div>
-        </div>
-        
-        <h2>Test Results</h2>
-        <table class="test-results">
-            <tr>
-                <th>Test Name</th>
-                <th>Status</th>
-                <th>Message</th>
-                <th>Duration</th>
-                <th>Timestamp</th>
-            </tr>
-    """
-    
-    # Add test results to the table
-    for result in test_results:
-        status_class = "pass" if result["success"] else "fail"
-        status_text = "PASS" if result["success"] else "FAIL"
-        
-        html_content += f"""
-            <tr>
-                <td>{result["name"]}</td>
-                <td class="{status_class}">{status_text}</td>
-                <td>{result["message"]}</td>
-                <td>{result["duration"]}</td>
-                <td>{result["timestamp"]}</td>
-            </tr>
-        """
-    
-    # Close HTML tags
-    html_content += """
-        </table>
-    </body>
-    </html>
-    """
+    html_content = REPORT_TEMPLATE.render(
+        results=test_results,
+        total=total_tests,
+        passed=passed_tests,
+        failed=failed_tests,
+        success_rate=success_rate,
+        now=datetime.now()
+    )
     
-    # Write the report to a file
-    with open(REPORT_FILE, "w") as f:
-        f.write(html_content)
+    # Write the report to a file and keep a copy for the report server
+    global report_bytes, report_etag
+    report_bytes = html_content.encode()
+    Path(REPORT_FILE).write_bytes(report_bytes)
+    report_etag = f'"{hashlib.md5(report_bytes).hexdigest()}"'
     
     logger.info(f"HTML report generated: {REPORT_FILE}")
     return REPORT_FILE
 
 
 @report_app.get("/", response_class=HTMLResponse)
-async def get_report():
+async def get_report(request: Request):
     """Serve the HTML report"""
-    global report_generated
-    
-    if not report_generated:
+    if report_bytes is None:
         # Generate the report if it hasn't been generated yet
-        report_path = generate_html_report()
-        report_generated = True
+        generate_html_report()
     
-    # Read the report file
-    with open(REPORT_FILE, "r") as f:
-        html_content = f.read()
+    # Let the browser reuse its copy when the report hasn't changed
+    if request.headers.get("if-none-match") == report_etag:
+        return Response(status_code=304, headers={"ETag": report_etag})
     
-    return HTMLResponse(content=html_content)
+    return Response(
+        content=report_bytes,
+        media_type="text/html",
+        headers={"ETag": report_etag}
+    )
 
 
 def run_verification():
@@ -292,27 +347,7 @@ def run_verification():
             return False
         
         # Run tests
-        run_test("Elasticsearch Connection", test_elasticsearch_connection)
-        
-        # Test storing and retrieving data
-        doc_id = run_test("Store Data", test_store_data)
-        if doc_id:
-            # Extract auid from the stored document
-            auid = None
-            try:
-                # Get the document from Elasticsearch to extract auid
-                response = requests.get(f"http://localhost:{ES_SERVER_PORT}/{ES_INDEX}/_doc/{doc_id}")
-                if response.status_code == 200:
-                    doc = response.json()
-                    auid = doc["_source"]["auid"]
-            except Exception as e:
-                logger.error(f"Error extracting auid: {str(e)}")
-            
-            if auid:
-                run_test("Get Data", lambda: test_get_data(auid))
-        
-        # Test with invalid auid
-        run_test("Invalid AUID", test_invalid_auid)
+        asyncio.run(run_tests())
         
         # Generate the report
         report_path = generate_html_report()
@@ -333,9 +368,12 @@ def run_verification():
         
         logger.info(f"Verification complete. Report available at http://localhost:{REPORT_PORT}")
         
-        # Keep the script running to serve the report
-        while True:
-            time.sleep(1)
+        # Keep the script running to serve the report until interrupted
+        shutdown = threading.Event()
+        signal.signal(signal.SIGINT, lambda *_: shutdown.set())
+        signal.signal(signal.SIGTERM, lambda *_: shutdown.set())
+        shutdown.wait()
+        logger.info("Verification report server shutting down")
             
     except KeyboardInterrupt:
         logger.info("Verification interrupted by user")